@@ -3,20 +3,31 @@
 Raspberry Pi Ads Player
 Supports both 16:9 and 6:19 screen orientations
 Optimized for Raspberry Pi hardware
+
+JPEG ads are decoded with libjpeg-turbo through simplejpeg when it is
+installed (pip install simplejpeg), falling back to pygame.image.load.
 """
 
 import pygame
 import os
+import io
 import sys
 import json
-import time
 import random
+import signal
+import types
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Tuple, Optional
 import subprocess
 import logging
 
+try:
+    import simplejpeg
+except ImportError:
+    simplejpeg = None
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -28,6 +39,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Posted by the SDL timer when it is time to rotate to the next ad
+AD_TIMER_EVENT = pygame.USEREVENT + 1
+
 class AdsPlayer:
     def __init__(self, config_file: str = "config.json"):
         """Initialize the ads player with configuration"""
@@ -37,9 +51,13 @@ class AdsPlayer:
         self.running = False
         self.current_ad_index = 0
         self.ads_list = []
+        self._ad_surfaces = []  # Pre-scaled surfaces parallel to ads_list
         self.screen_width = 0
         self.screen_height = 0
         self.orientation = "16:9"  # Default orientation
+        self._dirty = True  # Redraw needed on next loop iteration
+        self._video_text_cache = {}  # Placeholder text surfaces per video name
+        self._video_extensions = frozenset(['.mp4', '.avi', '.mov', '.mkv', '.wmv'])
         
         # Initialize pygame
         pygame.init()
@@ -48,10 +66,15 @@ class AdsPlayer:
         # Detect screen resolution and orientation
         self.detect_screen_orientation()
         
+        # Text that never changes is rendered once
+        self._font = pygame.font.Font(None, 74)
+        self._no_ads_surf = self._font.render("No Ads Available", True, (255, 255, 255))
+        self._no_ads_rect = self._no_ads_surf.get_rect(center=(self.screen_width//2, self.screen_height//2))
+        
         # Load ads content
         self.load_ads_content()
         
-    def load_config(self, config_file: str) -> dict:
+    def load_config(self, config_file: str) -> types.SimpleNamespace:
         """Load configuration from JSON file"""
         default_config = {
             "ads_directory": "ads",
@@ -63,12 +86,13 @@ class AdsPlayer:
             "background_color": [0, 0, 0],
             "supported_formats": [".jpg", ".jpeg", ".png", ".bmp", ".mp4", ".avi", ".mov"],
             "hardware_acceleration": True,
-            "fps": 30,
+            "fps": 2,
             "volume": 0.7,
             "loop_ads": True,
             "shuffle_ads": False
         }
         
+        config = default_config
         try:
             if os.path.exists(config_file):
                 with open(config_file, 'r') as f:
@@ -77,23 +101,24 @@ class AdsPlayer:
                 for key, value in default_config.items():
                     if key not in config:
                         config[key] = value
-                return config
             else:
                 # Create default config file
                 with open(config_file, 'w') as f:
                     json.dump(default_config, f, indent=4)
                 logger.info(f"Created default config file: {config_file}")
-                return default_config
         except Exception as e:
             logger.error(f"Error loading config: {e}")
-            return default_config
+            config = default_config
+        
+        # Attribute access is cheaper than dict lookups in the main loop
+        return types.SimpleNamespace(**config)
     
     def detect_screen_orientation(self):
         """Detect screen resolution and determine orientation"""
         try:
             # Try to get display info
-            if self.config.get("force_orientation"):
-                self.orientation = self.config["force_orientation"]
+            if self.config.force_orientation:
+                self.orientation = self.config.force_orientation
                 if self.orientation == "16:9":
                     self.screen_width, self.screen_height = 1920, 1080
                 else:  # 6:19
@@ -120,87 +145,190 @@ class AdsPlayer:
             self.screen_width, self.screen_height = 1920, 1080
             self.orientation = "16:9"
     
+    def is_raspberry_pi(self) -> bool:
+        """Check whether we are running on a Raspberry Pi"""
+        try:
+            with open('/proc/device-tree/model', 'r') as f:
+                return "Raspberry Pi" in f.read()
+        except OSError:
+            return False
+    
     def setup_display(self):
         """Setup pygame display"""
         try:
-            if self.config["fullscreen"]:
+            # Match the 16-bit HDMI framebuffer on the Pi to halve pixel bandwidth
+            depth = 0
+            if (getattr(self.config, "raspberry_pi", {}).get("optimize_for_performance", True)
+                    and self.is_raspberry_pi()):
+                depth = 16
+            
+            if self.config.fullscreen:
                 self.screen = pygame.display.set_mode(
                     (self.screen_width, self.screen_height), 
-                    pygame.FULLSCREEN | pygame.HWSURFACE | pygame.DOUBLEBUF
+                    pygame.FULLSCREEN | pygame.DOUBLEBUF,
+                    depth
                 )
             else:
                 self.screen = pygame.display.set_mode(
-                    (self.screen_width, self.screen_height)
+                    (self.screen_width, self.screen_height), 0, depth
                 )
             
             pygame.display.set_caption("Raspberry Pi Ads Player")
+            logger.info(f"Display depth: {self.screen.get_bitsize()} bpp")
             self.clock = pygame.time.Clock()
             
             # Hide cursor in fullscreen mode
-            if self.config["fullscreen"]:
+            if self.config.fullscreen:
                 pygame.mouse.set_visible(False)
+            
+            # Only queue the events we react to; drop mouse motion etc. in SDL
+            pygame.event.set_blocked(None)
+            pygame.event.set_allowed([pygame.QUIT, pygame.KEYDOWN, AD_TIMER_EVENT])
                 
             logger.info("Display setup complete")
             
+            # Surfaces can only be converted once the display exists
+            self.preload_ads()
+            
         except Exception as e:
             logger.error(f"Error setting up display: {e}")
             sys.exit(1)
     
     def load_ads_content(self):
         """Load all ads content from the ads directory"""
-        ads_dir = Path(self.config["ads_directory"])
+        ads_dir = Path(self.config.ads_directory)
         
         if not ads_dir.exists():
             ads_dir.mkdir(parents=True, exist_ok=True)
             logger.warning(f"Created ads directory: {ads_dir}")
             return
         
-        supported_formats = self.config["supported_formats"]
-        self.ads_list = []
+        supported_formats = frozenset(ext.lower() for ext in self.config.supported_formats)
+        ads = []
         
-        for file_path in ads_dir.iterdir():
-            if file_path.is_file() and file_path.suffix.lower() in supported_formats:
-                self.ads_list.append(str(file_path))
+        # scandir entries carry their file type, avoiding a stat per file
+        with os.scandir(ads_dir) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    dot = entry.name.rfind('.')
+                    if dot >= 0 and entry.name[dot:].lower() in supported_formats:
+                        ads.append(entry.path)
+        self.ads_list = ads
         
-        if self.config["shuffle_ads"]:
+        if self.config.shuffle_ads:
             random.shuffle(self.ads_list)
         
+        if self.screen is not None:
+            self.preload_ads()
+        
+        self._dirty = True
         logger.info(f"Loaded {len(self.ads_list)} ads from {ads_dir}")
         
         if not self.ads_list:
             logger.warning("No ads found! Please add media files to the ads directory.")
     
-    def scale_image_to_fit(self, image: pygame.Surface) -> pygame.Surface:
-        """Scale image to fit screen while maintaining aspect ratio"""
+    def preload_ads(self):
+        """Decode and scale all image ads once so showing one is a single blit"""
+        self._ad_surfaces = []
+        
+        # Read files on worker threads so SD card I/O overlaps with decoding here
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            for ad_path, data in zip(self.ads_list, executor.map(self.read_ad_file, self.ads_list)):
+                if data is None:
+                    self._ad_surfaces.append(None)
+                    continue
+                
+                try:
+                    image = self.load_image(ad_path, data)
+                    if image.get_flags() & pygame.SRCALPHA:
+                        # Blend transparency over the background once, as drawing it would
+                        flat = pygame.Surface(image.get_size()).convert(self.screen)
+                        flat.fill(self.config.background_color)
+                        flat.blit(image, (0, 0))
+                        image = flat
+                    else:
+                        image = image.convert(self.screen)
+                    self._ad_surfaces.append(self.scale_image_to_fit(image))
+                except Exception as e:
+                    logger.error(f"Error loading image {ad_path}: {e}")
+                    self._ad_surfaces.append(None)
+        
+        logger.info(f"Preloaded {sum(s is not None for s in self._ad_surfaces)} image ads")
+    
+    def read_ad_file(self, ad_path: str) -> Optional[bytes]:
+        """Read an image ad into memory, returning None for videos or on error"""
+        if self.is_video_file(ad_path):
+            return None
+        
+        try:
+            with open(ad_path, 'rb') as f:
+                return f.read()
+        except OSError as e:
+            logger.error(f"Error reading image {ad_path}: {e}")
+            return None
+    
+    def load_image(self, image_path: str, data: bytes) -> pygame.Surface:
+        """Decode image file contents, using libjpeg-turbo for JPEGs when available"""
+        if simplejpeg is not None and image_path.lower().endswith(('.jpg', '.jpeg')):
+            pixels = simplejpeg.decode_jpeg(data, colorspace='RGB')
+            height, width = pixels.shape[:2]
+            return pygame.image.frombuffer(pixels, (width, height), 'RGB')
+        
+        return pygame.image.load(io.BytesIO(data), image_path)
+    
+    def scale_image_to_fit(self, image: pygame.Surface,
+                           dest: Optional[pygame.Surface] = None) -> pygame.Surface:
+        """Scale image to fit screen while maintaining aspect ratio
+        
+        Without dest the result is a new surface in image's pixel format.
+        With dest it is a view into dest, which must share that format.
+        """
         img_width, img_height = image.get_size()
-        screen_ratio = self.screen_width / self.screen_height
-        img_ratio = img_width / img_height
         
-        if img_ratio > screen_ratio:
+        # Compare aspect ratios by cross-multiplying to stay in integers
+        if img_width * self.screen_height > self.screen_width * img_height:
             # Image is wider, scale by width
             new_width = self.screen_width
-            new_height = int(self.screen_width / img_ratio)
+            new_height = self.screen_width * img_height // img_width
         else:
             # Image is taller, scale by height
             new_height = self.screen_height
-            new_width = int(self.screen_height * img_ratio)
+            new_width = self.screen_height * img_width // img_height
         
-        return pygame.transform.scale(image, (new_width, new_height))
+        if (new_width, new_height) == (img_width, img_height):
+            return image
+        
+        if dest is None:
+            return pygame.transform.scale(image, (new_width, new_height))
+        view = dest.subsurface((0, 0, new_width, new_height))
+        return pygame.transform.scale(image, (new_width, new_height), view)
     
     def display_image(self, image_path: str):
         """Display an image ad"""
         try:
-            image = pygame.image.load(image_path)
-            scaled_image = self.scale_image_to_fit(image)
+            scaled_image = self._ad_surfaces[self.current_ad_index]
+            if scaled_image is None:
+                logger.error(f"Image not available: {os.path.basename(image_path)}")
+                return
             
             # Center the image on screen
-            x = (self.screen_width - scaled_image.get_width()) // 2
-            y = (self.screen_height - scaled_image.get_height()) // 2
+            width, height = scaled_image.get_size()
+            x = (self.screen_width - width) // 2
+            y = (self.screen_height - height) // 2
+            dirty = [pygame.Rect(x, y, width, height)]
+            
+            # Fill only the letterbox bars left visible around the image
+            if width < self.screen_width:
+                dirty.append(pygame.Rect(0, 0, x, self.screen_height))
+                dirty.append(pygame.Rect(x + width, 0, self.screen_width - (x + width), self.screen_height))
+            if height < self.screen_height:
+                dirty.append(pygame.Rect(0, 0, self.screen_width, y))
+                dirty.append(pygame.Rect(0, y + height, self.screen_width, self.screen_height - (y + height)))
+            for bar in dirty[1:]:
+                self.screen.fill(self.config.background_color, bar)
             
-            # Fill background
-            self.screen.fill(self.config["background_color"])
             self.screen.blit(scaled_image, (x, y))
-            pygame.display.flip()
+            pygame.display.update(dirty)
             
             logger.info(f"Displaying image: {os.path.basename(image_path)}")
             
@@ -216,35 +344,45 @@ class AdsPlayer:
                 self.video_player = VideoPlayer(self.screen, self.screen_width, self.screen_height)
             
             # Play video for the configured duration
-            duration = self.config["display_duration"]
-            self.video_player.play_video(video_path, duration)
+            duration = self.config.display_duration
+            
+            # Let the player warm up the next ad if it is also a video
+            next_ad = self.ads_list[(self.current_ad_index + 1) % len(self.ads_list)]
+            next_video = next_ad if self.is_video_file(next_ad) else None
+            
+            # Clear the last ad so nothing stale shows if the player exits early
+            self.screen.fill(self.config.background_color)
+            pygame.display.flip()
+            self.video_player.play_video(video_path, duration, next_video)
+            
+            # The video's slot is over (or it ended early); move straight on
+            self.next_ad()
             
         except ImportError:
             logger.error("Video player module not available")
             # Fallback to placeholder
-            self.screen.fill(self.config["background_color"])
-            font = pygame.font.Font(None, 74)
-            text = font.render(f"VIDEO: {os.path.basename(video_path)}", True, (255, 255, 255))
-            text_rect = text.get_rect(center=(self.screen_width//2, self.screen_height//2))
-            self.screen.blit(text, text_rect)
+            self.screen.fill(self.config.background_color)
+            filename = os.path.basename(video_path)
+            if filename not in self._video_text_cache:
+                text = self._font.render(f"VIDEO: {filename}", True, (255, 255, 255))
+                text_rect = text.get_rect(center=(self.screen_width//2, self.screen_height//2))
+                self._video_text_cache[filename] = (text, text_rect)
+            self.screen.blit(*self._video_text_cache[filename])
             pygame.display.flip()
         except Exception as e:
             logger.error(f"Error playing video {video_path}: {e}")
     
     def is_video_file(self, file_path: str) -> bool:
         """Check if file is a video"""
-        video_extensions = ['.mp4', '.avi', '.mov', '.mkv', '.wmv']
-        return Path(file_path).suffix.lower() in video_extensions
+        dot = file_path.rfind('.')
+        return dot >= 0 and file_path[dot:].lower() in self._video_extensions
     
     def display_current_ad(self):
         """Display the current ad"""
         if not self.ads_list:
             # No ads available, show message
-            self.screen.fill(self.config["background_color"])
-            font = pygame.font.Font(None, 74)
-            text = font.render("No Ads Available", True, (255, 255, 255))
-            text_rect = text.get_rect(center=(self.screen_width//2, self.screen_height//2))
-            self.screen.blit(text, text_rect)
+            self.screen.fill(self.config.background_color)
+            self.screen.blit(self._no_ads_surf, self._no_ads_rect)
             pygame.display.flip()
             return
         
@@ -259,12 +397,15 @@ class AdsPlayer:
         """Move to the next ad"""
         if self.ads_list:
             self.current_ad_index = (self.current_ad_index + 1) % len(self.ads_list)
+            self._dirty = True
     
     def handle_events(self):
         """Handle pygame events"""
-        for event in pygame.event.get():
+        for event in pygame.event.get([pygame.QUIT, pygame.KEYDOWN, AD_TIMER_EVENT]):
             if event.type == pygame.QUIT:
                 self.running = False
+            elif event.type == AD_TIMER_EVENT:
+                self.next_ad()
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE or event.key == pygame.K_q:
                     self.running = False
@@ -276,41 +417,54 @@ class AdsPlayer:
                 elif event.key == pygame.K_s:
                     # Shuffle ads
                     if self.ads_list:
-                        random.shuffle(self.ads_list)
+                        # Keep the preloaded surfaces aligned with the ads
+                        order = list(range(len(self.ads_list)))
+                        random.shuffle(order)
+                        self.ads_list = [self.ads_list[i] for i in order]
+                        self._ad_surfaces = [self._ad_surfaces[i] for i in order]
                         self.current_ad_index = 0
+                        self._dirty = True
     
     def run(self):
         """Main game loop"""
         self.setup_display()
         self.running = True
         
-        last_ad_change = time.time()
-        display_duration = self.config["display_duration"]
+        fps = self.config.fps
+        ad_ms = int(self.config.display_duration * 1000)
         
         logger.info("Starting ads player...")
         logger.info(f"Controls: ESC/Q=Quit, SPACE=Next Ad, R=Reload, S=Shuffle")
         
-        while self.running:
-            current_time = time.time()
-            
-            self.handle_events()
-            
-            # Check if it's time to change ads
-            if current_time - last_ad_change >= display_duration:
-                self.next_ad()
-                last_ad_change = current_time
-            
-            # Display current ad
-            self.display_current_ad()
-            
-            # Control frame rate
-            self.clock.tick(self.config["fps"])
+        try:
+            while self.running:
+                self.handle_events()
+                
+                # Redraw only when the ad changed; the last frame stays on screen
+                if self._dirty:
+                    self._dirty = False
+                    self.display_current_ad()
+                    # Let SDL schedule rotation, counting from when this ad went up
+                    pygame.event.clear(AD_TIMER_EVENT)
+                    pygame.time.set_timer(AD_TIMER_EVENT, ad_ms)
+                    self.clock.tick(fps)
+                else:
+                    # Nothing animates between ad changes, so just idle
+                    pygame.time.wait(50)
+        finally:
+            # Players run in their own session, so they don't see our Ctrl-C
+            if hasattr(self, 'video_player'):
+                self.video_player.close()
         
         logger.info("Ads player stopped")
         pygame.quit()
 
 def main():
     """Main entry point"""
+    # Exit through run()'s cleanup on SIGTERM; video players are in their own
+    # session and would otherwise outlive us
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    
     try:
         player = AdsPlayer()
         player.run()
@@ -50,7 +50,7 @@ run_cmd "Installing essential packages" "sudo apt install -y $ESSENTIAL_PACKAGES
 # Install multimedia packages for Raspberry Pi
 if [[ "$IS_RASPI" == true ]]; then
     echo "🎬 Installing Raspberry Pi multimedia packages..."
-    RASPI_PACKAGES="omxplayer vlc ffmpeg libsdl2-dev libsdl2-image-dev libsdl2-mixer-dev libsdl2-ttf-dev libfreetype6-dev libportmidi-dev libjpeg-dev python3-dev python3-numpy libatlas-base-dev"
+    RASPI_PACKAGES="mpv omxplayer vlc ffmpeg libsdl2-dev libsdl2-image-dev libsdl2-mixer-dev libsdl2-ttf-dev libfreetype6-dev libportmidi-dev libjpeg62-turbo-dev python3-dev python3-numpy libatlas-base-dev"
     run_cmd "Installing Raspberry Pi packages" "sudo apt install -y $RASPI_PACKAGES"
     
     # Optimize GPU memory split
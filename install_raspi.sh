@@ -15,6 +15,7 @@ sudo apt install -y python3 python3-pip python3-venv
 # Install multimedia libraries and hardware acceleration
 echo "🎬 Installing multimedia libraries..."
 sudo apt install -y \
+    mpv \
     omxplayer \
     vlc \
     ffmpeg \
@@ -24,7 +25,7 @@ sudo apt install -y \
     libsdl2-ttf-dev \
     libfreetype6-dev \
     libportmidi-dev \
-    libjpeg-dev \
+    libjpeg62-turbo-dev \
     python3-dev \
     python3-numpy \
     libatlas-base-dev
@@ -18,31 +18,39 @@ class AdsPlayerManager:
         self.script_dir = Path(__file__).parent
         self.ads_dir = self.script_dir / "ads"
         self.config_file = self.script_dir / "config.json"
+        self._service_active = None  # Cached systemctl state for this command
         
-    def run_command(self, cmd, capture_output=True):
-        """Run a system command safely"""
+    def run_command(self, argv, capture_output=True, cwd=None):
+        """Run a system command safely (argv list, no shell)"""
         try:
             if capture_output:
-                result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
+                result = subprocess.run(argv, capture_output=True, text=True, cwd=cwd)
                 return result.returncode == 0, result.stdout, result.stderr
             else:
-                result = subprocess.run(cmd, shell=True)
+                result = subprocess.run(argv, cwd=cwd)
                 return result.returncode == 0, "", ""
         except Exception as e:
             return False, "", str(e)
 
+    def service_state(self):
+        """Get the service state, querying systemctl at most once per command"""
+        if self._service_active is None:
+            success, stdout, _ = self.run_command(["systemctl", "is-active", self.service_name])
+            self._service_active = stdout.strip() if success else "inactive"
+        return self._service_active
+
     def start(self):
         """Start the ads player"""
         print("🚀 Starting Ads Player...")
         
         # Check if running as service first
-        success, stdout, stderr = self.run_command(f"systemctl is-active {self.service_name}")
-        if "active" in stdout:
+        if self.service_state() == "active":
             print("✅ Ads Player service is already running!")
             return True
         
         # Try to start as service
-        success, _, _ = self.run_command(f"sudo systemctl start {self.service_name}")
+        success, _, _ = self.run_command(["sudo", "systemctl", "start", self.service_name])
+        self._service_active = None
         if success:
             print("✅ Ads Player service started successfully!")
             time.sleep(2)
@@ -51,7 +59,7 @@ class AdsPlayerManager:
         
         # Fall back to direct execution
         print("📱 Starting in direct mode (service not available)...")
-        success, _, _ = self.run_command(f"cd {self.script_dir} && python3 ads_player.py", capture_output=False)
+        success, _, _ = self.run_command(["python3", "ads_player.py"], capture_output=False, cwd=self.script_dir)
         return success
 
     def stop(self):
@@ -59,14 +67,13 @@ class AdsPlayerManager:
         print("🛑 Stopping Ads Player...")
         
         # Stop service
-        success, _, _ = self.run_command(f"sudo systemctl stop {self.service_name}")
+        success, _, _ = self.run_command(["sudo", "systemctl", "stop", self.service_name])
+        self._service_active = None
         if success:
             print("✅ Ads Player service stopped!")
         
         # Also kill any direct processes
-        self.run_command("pkill -f ads_player.py")
-        self.run_command("pkill -f omxplayer")
-        self.run_command("pkill -f vlc")
+        self.run_command(["pkill", "-f", "ads_player.py|omxplayer|vlc|mpv|ffmpeg"])
         
         print("✅ All ads player processes stopped!")
         return True
@@ -84,12 +91,10 @@ class AdsPlayerManager:
         print("=" * 50)
         
         # Service status
-        success, stdout, stderr = self.run_command(f"systemctl is-active {self.service_name}")
-        service_status = stdout.strip() if success else "inactive"
-        print(f"Service Status: {service_status}")
+        print(f"Service Status: {self.service_state()}")
         
         # Process check
-        success, stdout, _ = self.run_command("pgrep -f ads_player.py")
+        success, stdout, _ = self.run_command(["pgrep", "-f", "ads_player.py"])
         if success and stdout:
             print(f"Process ID: {stdout.strip()}")
         else:
@@ -110,7 +115,7 @@ class AdsPlayerManager:
         
         # Recent logs
         print("\n📋 Recent Logs:")
-        success, stdout, _ = self.run_command(f"journalctl -u {self.service_name} --no-pager -n 5")
+        success, stdout, _ = self.run_command(["journalctl", "-u", self.service_name, "--no-pager", "-n", "5"])
         if success and stdout:
             print(stdout)
         else:
@@ -119,7 +124,7 @@ class AdsPlayerManager:
     def enable_autostart(self):
         """Enable automatic startup on boot"""
         print("⚡ Enabling auto-start on boot...")
-        success, _, _ = self.run_command(f"sudo systemctl enable {self.service_name}")
+        success, _, _ = self.run_command(["sudo", "systemctl", "enable", self.service_name])
         if success:
             print("✅ Auto-start enabled! Ads Player will start on boot.")
         else:
@@ -129,7 +134,7 @@ class AdsPlayerManager:
     def disable_autostart(self):
         """Disable automatic startup on boot"""
         print("🚫 Disabling auto-start on boot...")
-        success, _, _ = self.run_command(f"sudo systemctl disable {self.service_name}")
+        success, _, _ = self.run_command(["sudo", "systemctl", "disable", self.service_name])
         if success:
             print("✅ Auto-start disabled.")
         else:
@@ -163,9 +168,9 @@ WantedBy=graphical.target
             f.write(service_content)
         
         # Install service
-        success, _, _ = self.run_command(f"sudo cp {service_file} /etc/systemd/system/")
+        success, _, _ = self.run_command(["sudo", "cp", service_file, "/etc/systemd/system/"])
         if success:
-            self.run_command("sudo systemctl daemon-reload")
+            self.run_command(["sudo", "systemctl", "daemon-reload"])
             print("✅ Service installed successfully!")
             return True
         else:
@@ -217,7 +222,7 @@ WantedBy=graphical.target
     def create_test_media(self):
         """Create test media files"""
         print("🎨 Creating test media files...")
-        success, _, _ = self.run_command(f"cd {self.script_dir} && python3 test_images.py")
+        success, _, _ = self.run_command(["python3", "test_images.py"], cwd=self.script_dir)
         if success:
             print("✅ Test media created!")
         else:
@@ -230,14 +235,14 @@ WantedBy=graphical.target
         print("=" * 50)
         
         # Service logs
-        success, stdout, _ = self.run_command(f"journalctl -u {self.service_name} --no-pager -n {lines}")
+        success, stdout, _ = self.run_command(["journalctl", "-u", self.service_name, "--no-pager", "-n", str(lines)])
         if success and stdout:
             print(stdout)
         else:
             # Try log file
             log_file = self.script_dir / "ads_player.log"
             if log_file.exists():
-                success, stdout, _ = self.run_command(f"tail -n {lines} {log_file}")
+                success, stdout, _ = self.run_command(["tail", "-n", str(lines), str(log_file)])
                 if success:
                     print(stdout)
             else:
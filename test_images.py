@@ -2,76 +2,90 @@
 """
 Generate sample test images for the Raspberry Pi Ads Player
 Creates images optimized for both 16:9 and 6:19 screen orientations
+
+Runs roughly twice as fast with Pillow-SIMD on a Pi 4/5:
+    CC="cc -mcpu=cortex-a72" pip install --no-binary :all: pillow-simd
 """
 
 import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 import random
 
-def create_test_image(width, height, text, filename, orientation):
-    """Create a test image with specified dimensions and text"""
-    
-    # Create image with random background color
-    bg_colors = [
-        (255, 100, 100),  # Red
-        (100, 255, 100),  # Green
-        (100, 100, 255),  # Blue
-        (255, 255, 100),  # Yellow
-        (255, 100, 255),  # Magenta
-        (100, 255, 255),  # Cyan
-        (200, 150, 100),  # Brown
-        (150, 100, 200),  # Purple
-    ]
-    
-    bg_color = random.choice(bg_colors)
-    image = Image.new('RGB', (width, height), bg_color)
-    draw = ImageDraw.Draw(image)
-    
-    # Try to load a font, fall back to default if not available
+@lru_cache(maxsize=None)
+def get_font(size):
+    """Load the text font once per size, falling back to the default font"""
     try:
-        font_size = min(width, height) // 20
-        font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", font_size)
+        return ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", size)
     except:
         try:
-            font_size = min(width, height) // 30
-            font = ImageFont.load_default()
+            return ImageFont.load_default()
         except:
-            font = None
+            return None
+
+def corner_triangles(width, height):
+    """Vertices of the decorative top-left and bottom-right triangles"""
+    triangle_size = min(width, height) // 10
+    return (
+        [(0, 0), (triangle_size, 0), (0, triangle_size)],
+        [(width, height), (width-triangle_size, height), (width, height-triangle_size)],
+    )
+
+# Background colors picked at random per image
+BG_COLORS = [
+    (255, 100, 100),  # Red
+    (100, 255, 100),  # Green
+    (100, 100, 255),  # Blue
+    (255, 255, 100),  # Yellow
+    (255, 100, 255),  # Magenta
+    (100, 255, 255),  # Cyan
+    (200, 150, 100),  # Brown
+    (150, 100, 200),  # Purple
+]
+
+def create_test_image(width, height, text, filename, orientation, bg_color, triangles):
+    """Create a test image with specified dimensions and text"""
+    
+    # Create image with the given background color
+    image = Image.fromarray(np.full((height, width, 3), bg_color, dtype=np.uint8))
+    draw = ImageDraw.Draw(image)
+    
+    font_size = min(width, height) // 20
+    font = get_font(font_size)
     
     # Add orientation indicator
     orientation_text = f"Sample Ad - {orientation} Format"
     text_lines = [orientation_text, text, f"{width}x{height}"]
     
-    # Calculate text positioning
-    y_offset = height // 4
-    for i, line in enumerate(text_lines):
-        if font:
-            bbox = draw.textbbox((0, 0), line, font=font)
-            text_width = bbox[2] - bbox[0]
-            text_height = bbox[3] - bbox[1]
-        else:
-            text_width = len(line) * 10
-            text_height = 20
-        
-        x = (width - text_width) // 2
-        y = y_offset + (i * (text_height + 20))
-        
-        # Draw text with shadow
-        shadow_offset = 3
-        draw.text((x + shadow_offset, y + shadow_offset), line, fill=(0, 0, 0), font=font)
-        draw.text((x, y), line, fill=(255, 255, 255), font=font)
+    # Draw all lines in one call, centered as a block
+    block = "\n".join(text_lines)
+    bbox = draw.multiline_textbbox((0, 0), block, font=font, spacing=20, align="center")
+    x = (width - (bbox[2] - bbox[0])) // 2
+    y = height // 4
+    
+    # Draw text with shadow
+    shadow_offset = 3
+    draw.multiline_text((x + shadow_offset, y + shadow_offset), block, fill=(0, 0, 0),
+                        font=font, spacing=20, align="center")
+    draw.multiline_text((x, y), block, fill=(255, 255, 255), font=font, spacing=20, align="center")
     
     # Add some decorative elements
     # Corner triangles
-    triangle_size = min(width, height) // 10
-    draw.polygon([(0, 0), (triangle_size, 0), (0, triangle_size)], fill=(255, 255, 255, 128))
-    draw.polygon([(width, height), (width-triangle_size, height), (width, height-triangle_size)], fill=(255, 255, 255, 128))
+    for triangle in triangles:
+        draw.polygon(triangle, fill=(255, 255, 255, 128))
     
     # Save the image
     filepath = os.path.join("ads", filename)
-    image.save(filepath, "PNG")
+    # Fast zlib level; flat test images compress well regardless
+    image.save(filepath, "PNG", compress_level=1)
     print(f"Created: {filepath}")
 
+def create_test_image_worker(job):
+    """Unpack a (width, height, text, filename, orientation, bg_color, triangles) job for the pool"""
+    create_test_image(*job)
+
 def main():
     """Generate test images for both orientations"""
     print("🎨 Generating test images for Raspberry Pi Ads Player...")
@@ -86,13 +100,14 @@ def main():
         (1280, 720),
     ]
     
+    jobs = []
     for i, (width, height) in enumerate(landscape_resolutions):
-        create_test_image(
+        jobs.append((
             width, height, 
             f"Landscape Ad #{i+1}\nGreat for horizontal displays!",
             f"landscape_{width}x{height}_ad{i+1}.png",
             "16:9"
-        )
+        ))
     
     # 6:19 portrait images
     portrait_resolutions = [
@@ -102,12 +117,12 @@ def main():
     ]
     
     for i, (width, height) in enumerate(portrait_resolutions):
-        create_test_image(
+        jobs.append((
             width, height,
             f"Portrait Ad #{i+1}\nPerfect for vertical displays!",
             f"portrait_{width}x{height}_ad{i+1}.png",
             "6:19"
-        )
+        ))
     
     # Create some generic ads
     generic_ads = [
@@ -120,8 +135,18 @@ def main():
     
     for i, text in enumerate(generic_ads):
         # Create both orientations for generic ads
-        create_test_image(1920, 1080, text, f"generic_16_9_ad{i+1}.png", "16:9")
-        create_test_image(1080, 1920, text, f"generic_6_19_ad{i+1}.png", "6:19")
+        jobs.append((1920, 1080, text, f"generic_16_9_ad{i+1}.png", "16:9"))
+        jobs.append((1080, 1920, text, f"generic_6_19_ad{i+1}.png", "6:19"))
+    
+    # Most images share a few resolutions, so compute their geometry once
+    triangles = {size: corner_triangles(*size) for size in {job[:2] for job in jobs}}
+    
+    # Pick colors here; forked workers would all inherit the same RNG state
+    jobs = [job + (random.choice(BG_COLORS), triangles[job[:2]]) for job in jobs]
+    
+    # PNG encoding is CPU bound, so spread the images across all cores
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        list(executor.map(create_test_image_worker, jobs))
     
     print("✅ Test image generation complete!")
     print(f"📁 Images saved to: {os.path.abspath('ads')}")
@@ -2,18 +2,90 @@
 """
 Video Player Module for Raspberry Pi Ads Player
 Optimized for hardware acceleration on Raspberry Pi
+
+With dbus-python installed, one omxplayer instance is kept alive and
+switched between videos over D-Bus instead of being restarted per ad.
 """
 
 import pygame
+import pygame.freetype
+import queue
+import selectors
+import shutil
+import signal
+import stat
 import subprocess
 import threading
+import itertools
 import time
 import os
 import logging
+from functools import lru_cache
 from pathlib import Path
 
+try:
+    import orjson as json
+except ImportError:
+    import json
+
+try:
+    import dbus
+except ImportError:
+    dbus = None
+
+try:
+    import av
+except ImportError:
+    av = None
+
 logger = logging.getLogger(__name__)
 
+# D-Bus name prefix for the omxplayer instances we start
+OMX_DBUS_NAME = 'org.mpris.MediaPlayer2.adplayer'
+
+# omxplayer lifecycle: no process, paused and hidden between ads, showing an ad
+OMX_UNINIT, OMX_IDLE, OMX_PLAYING = 'uninit', 'idle', 'playing'
+
+# Placeholder background color for each animation intensity
+_BG = tuple((i >> 2, i // 6, i >> 3) for i in range(256))
+
+def _probe_with_av(video_path):
+    """Read video metadata in-process with PyAV, in ffprobe's output layout"""
+    with av.open(video_path) as container:
+        streams = []
+        for stream in container.streams:
+            # Data streams such as a .mov timecode track have no codec context
+            if stream.codec_context is None:
+                continue
+            entry = {'codec_name': stream.codec_context.name}
+            if stream.type == 'video':
+                entry['width'] = stream.width
+                entry['height'] = stream.height
+            streams.append(entry)
+        
+        info = {'streams': streams}
+        if container.duration is not None:
+            info['format'] = {'duration': f"{container.duration / av.time_base:.6f}"}
+        return info
+
+@lru_cache(maxsize=128)
+def _probe_video(video_path, mtime, size):
+    """Probe a video once per file version; mtime and size only key the cache"""
+    # libavformat in-process avoids starting an ffprobe process per file
+    if av is not None:
+        return _probe_with_av(video_path)
+    
+    cmd = [
+        'ffprobe', '-v', 'quiet', '-print_format', 'json',
+        '-show_entries', 'format=duration:stream=codec_name,width,height',
+        video_path
+    ]
+    # Keep the output as bytes; both orjson and json parse bytes directly
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    if result.returncode == 0:
+        return json.loads(result.stdout)
+    return None
+
 class VideoPlayer:
     def __init__(self, screen, screen_width, screen_height):
         """Initialize video player with screen reference"""
@@ -22,46 +94,308 @@ class VideoPlayer:
         self.screen_height = screen_height
         self.is_playing = False
         self.current_process = None
+        self._omx_player = None  # D-Bus interface of the running omxplayer
+        self._omx_ids = itertools.count()  # Numbers each omxplayer's D-Bus name
+        self._omx_state = OMX_UNINIT
+        self._prefetch = None  # (path, process, player) of a hidden omxplayer
+        self._prefetch_thread = None
+        self._stat_cache = {}  # path -> monotonic time it was last seen as a file
+        
+        # Single-threaded wait on player exit (pidfd) instead of blocking in wait()
+        self._selector = selectors.DefaultSelector()
+        
+        # Pick the best available player once rather than probing per video
+        self._play_fn = self._detect_player()
+        
+        # GPU memory split, to warn before omxplayer runs out of it
+        self._gpu_mb = self._vcgencmd_mem('gpu') if shutil.which('vcgencmd') else None
+        if self._gpu_mb is not None:
+            logger.info(f"GPU memory split: {self._gpu_mb}MB")
+        
+    def _wait_for_exit(self, timeout=None):
+        """Wait for the player process while keeping the pygame window responsive
         
+        Returns False if the timeout expired with the process still running.
+        """
+        process = self.current_process
+        try:
+            pidfd = os.pidfd_open(process.pid)
+        except (AttributeError, OSError):
+            pidfd = None  # Older kernel or Python; poll once per time slice
+        else:
+            self._selector.register(pidfd, selectors.EVENT_READ)
+        
+        # SDL exposes no event fd, so wake at least every 50ms to pump events
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            while process.poll() is None:
+                remaining = 0.05 if deadline is None else min(0.05, deadline - time.monotonic())
+                if remaining <= 0:
+                    return False
+                if pidfd is not None:
+                    self._selector.select(remaining)
+                else:
+                    time.sleep(remaining)
+                pygame.event.pump()
+            return True
+        finally:
+            if pidfd is not None:
+                self._selector.unregister(pidfd)
+                os.close(pidfd)
+    
+    def _detect_player(self):
+        """Choose the best installed video player"""
+        if shutil.which('mpv'):
+            player = self.play_video_mpv
+        elif shutil.which('omxplayer'):
+            player = self.play_video_omxplayer
+        elif shutil.which('cvlc'):
+            player = self.play_video_vlc
+        elif shutil.which('ffmpeg'):
+            player = self.play_video_ffmpeg
+        else:
+            player = self.play_video_pygame
+        logger.info(f"Using video player: {player.__name__}")
+        return player
+    
     def get_video_info(self, video_path):
-        """Get video information using ffprobe"""
+        """Get video information using ffprobe (cached until the file changes)"""
         try:
-            cmd = [
-                'ffprobe', '-v', 'quiet', '-print_format', 'json',
-                '-show_format', '-show_streams', video_path
-            ]
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            if result.returncode == 0:
-                import json
-                info = json.loads(result.stdout)
-                return info
+            st = os.stat(video_path)
+            return _probe_video(video_path, st.st_mtime, st.st_size)
         except Exception as e:
             logger.error(f"Error getting video info: {e}")
         return None
     
-    def play_video_omxplayer(self, video_path, duration=None):
-        """Play video using omxplayer (Raspberry Pi optimized)"""
+    def play_video_mpv(self, video_path, duration=None, next_path=None):
+        """Play video using mpv with hardware decoding"""
         try:
-            # OMXPlayer command for Raspberry Pi hardware acceleration
             cmd = [
-                'omxplayer',
-                '--no-osd',           # No on-screen display
-                '--no-keys',          # Disable keyboard input
-                '--aspect-mode', 'letterbox',  # Maintain aspect ratio
-                '--vol', '0',         # Mute audio for ads
-                video_path
+                'mpv',
+                '--hwdec=auto',       # GPU decoding (V4L2/DRM on Raspberry Pi)
+                '--fs',               # Fullscreen mode
+                '--ontop',            # Cover the pygame window
+                '--no-audio',         # No audio for ads
+                '--really-quiet',     # No terminal output
             ]
             
-            # Add timeout if duration specified
+            # Stop playback after the ad duration
             if duration:
-                cmd.extend(['--timeout', str(duration)])
+                cmd.extend(['--length', str(duration)])
+            cmd.append(video_path)
+            
+            logger.info(f"Starting mpv for: {os.path.basename(video_path)}")
+            self.current_process = subprocess.Popen(cmd, start_new_session=True)
+            self.is_playing = True
+            
+            if not self._wait_for_exit(duration + 1 if duration else None):
+                self.stop_video()
+            self.is_playing = False
+            
+        except FileNotFoundError:
+            logger.warning("mpv not found, falling back to OMXPlayer")
+            self.play_video_omxplayer(video_path, duration, next_path)
+        except Exception as e:
+            logger.error(f"Error playing video with mpv: {e}")
+            self.is_playing = False
+    
+    def _vcgencmd_mem(self, which):
+        """Query GPU memory in MB via vcgencmd, or None if unavailable"""
+        try:
+            result = subprocess.run(['vcgencmd', 'get_mem', which], capture_output=True, text=True)
+            # Output looks like "gpu=128M"
+            return int(result.stdout.strip().split('=', 1)[1].rstrip('M'))
+        except (OSError, IndexError, ValueError):
+            return None
+    
+    def _ensure_gpu_memory(self):
+        """Flush the GPU cache before starting omxplayer if free memory is low"""
+        if self._gpu_mb is None:
+            return
+        
+        free_mb = self._vcgencmd_mem('reloc')
+        if free_mb is None or free_mb >= 64:
+            return
+        
+        logger.warning(f"Only {free_mb}MB of {self._gpu_mb}MB GPU memory free; "
+                       "consider raising gpu_mem= in /boot/config.txt")
+        subprocess.run(['vcgencmd', 'cache_flush'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        time.sleep(1 / 60)  # Give the firmware a frame to release memory
+    
+    def _omx_dbus_name(self):
+        """Unique D-Bus name for a new omxplayer
+        
+        A player being killed may still own its name, so names are never reused.
+        """
+        return f"{OMX_DBUS_NAME}.p{next(self._omx_ids)}"
+    
+    def _omx_command(self, video_path, dbus_name, hidden=False, loop=False):
+        """Build the omxplayer command line"""
+        # OMXPlayer command for Raspberry Pi hardware acceleration
+        cmd = [
+            'omxplayer',
+            '--no-osd',           # No on-screen display
+            '--no-keys',          # Disable keyboard input
+            '--aspect-mode', 'letterbox',  # Maintain aspect ratio
+            '--vol', '0',         # Mute audio for ads
+            '--dbus_name', dbus_name,  # Remote control for later ads
+        ]
+        
+        # Start below the current video and fully transparent
+        if hidden:
+            cmd.extend(['--layer', '-1', '--alpha', '0'])
+        
+        # Don't exit at the end of the file, so the decoder stays set up
+        if loop:
+            cmd.append('--loop')
+        
+        cmd.append(video_path)
+        return cmd
+    
+    def _omx_connect(self, process, dbus_name):
+        """Connect to the D-Bus interface of an omxplayer we started"""
+        # omxplayer publishes the address of its private bus in /tmp
+        address_file = f"/tmp/omxplayerdbus.{os.getenv('USER', 'root')}"
+        deadline = time.monotonic() + 5
+        
+        while time.monotonic() < deadline and process.poll() is None:
+            try:
+                with open(address_file, 'r') as f:
+                    bus = dbus.bus.BusConnection(f.read().strip())
+                obj = bus.get_object(dbus_name, '/org/mpris/MediaPlayer2', introspect=False)
+                player = dbus.Interface(obj, 'org.mpris.MediaPlayer2.Player')
+                player.Play()  # Fails until omxplayer has registered its name
+                return player
+            except Exception:
+                time.sleep(0.1)
+        
+        logger.warning("Could not connect to OMXPlayer over D-Bus")
+        return None
+    
+    def _omx_set_alpha(self, player, alpha):
+        """Show (255) or hide (0) an omxplayer video layer"""
+        player.SetAlpha(dbus.ObjectPath('/not/used'), dbus.Int64(alpha))
+    
+    def _terminate_process(self, process):
+        """Stop a player process together with any children it spawned"""
+        # Players run in their own session, so the process group id is the pid.
+        # Signalling the group also reaches omxplayer.bin behind the wrapper.
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+            process.wait(timeout=5)
+        except ProcessLookupError:
+            pass
+        except subprocess.TimeoutExpired:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        except Exception as e:
+            logger.error(f"Error stopping video: {e}")
+    
+    def _prefetch_omxplayer(self, video_path, loop=False):
+        """Start a hidden, paused omxplayer for the next video"""
+        dbus_name = self._omx_dbus_name()
+        try:
+            self._ensure_gpu_memory()
+            process = subprocess.Popen(self._omx_command(video_path, dbus_name, hidden=True, loop=loop),
+                                       start_new_session=True)
+        except Exception as e:
+            logger.warning(f"Could not prefetch {os.path.basename(video_path)}: {e}")
+            return
+        
+        player = self._omx_connect(process, dbus_name)
+        if player is None:
+            self._terminate_process(process)
+            return
+        
+        try:
+            player.Pause()
+            player.SetPosition(dbus.ObjectPath('/not/used'), dbus.Int64(0))
+            self._prefetch = (video_path, process, player)
+            logger.info(f"Prefetched OMXPlayer for: {os.path.basename(video_path)}")
+        except Exception as e:
+            logger.warning(f"Could not prefetch {os.path.basename(video_path)}: {e}")
+            self._terminate_process(process)
+    
+    def _take_prefetched(self, video_path):
+        """Swap in the prefetched omxplayer if it holds video_path"""
+        if self._prefetch_thread is not None:
+            self._prefetch_thread.join()
+            self._prefetch_thread = None
+        
+        prefetch, self._prefetch = self._prefetch, None
+        if prefetch is None:
+            return False
+        
+        path, process, player = prefetch
+        if path != video_path or process.poll() is not None:
+            threading.Thread(target=self._terminate_process, args=(process,), daemon=True).start()
+            return False
+        
+        try:
+            player.SetLayer(dbus.Int64(0))
+            self._omx_set_alpha(player, 255)
+            player.Play()
+        except Exception as e:
+            logger.warning(f"Prefetched OMXPlayer failed to start: {e}")
+            threading.Thread(target=self._terminate_process, args=(process,), daemon=True).start()
+            return False
+        
+        # The previous player is hidden already; let it exit in the background
+        if self.current_process is not None and self.current_process.poll() is None:
+            threading.Thread(target=self._terminate_process, args=(self.current_process,), daemon=True).start()
+        self.current_process, self._omx_player = process, player
+        self._omx_state = OMX_PLAYING
+        logger.info(f"Switched to prefetched OMXPlayer for: {os.path.basename(video_path)}")
+        return True
+    
+    def play_video_omxplayer(self, video_path, duration=None, next_path=None):
+        """Play video using omxplayer (Raspberry Pi optimized)"""
+        try:
+            # Loop timed ads under D-Bus control so the process outlives the file
+            loop = bool(duration) and dbus is not None
             
-            logger.info(f"Starting OMXPlayer for: {os.path.basename(video_path)}")
-            self.current_process = subprocess.Popen(cmd)
+            self._take_prefetched(video_path)
+            if self._omx_state == OMX_IDLE and self.current_process.poll() is None:
+                # Reuse the resident omxplayer instead of paying its startup cost again
+                try:
+                    logger.info(f"Switching OMXPlayer to: {os.path.basename(video_path)}")
+                    self._omx_player.OpenUri(video_path)
+                    self._omx_set_alpha(self._omx_player, 255)
+                    self._omx_player.Play()
+                    self._omx_state = OMX_PLAYING
+                except Exception as e:
+                    logger.warning(f"OMXPlayer D-Bus switch failed, restarting it: {e}")
+                    self.stop_video()
+            
+            if self._omx_state != OMX_PLAYING:
+                logger.info(f"Starting OMXPlayer for: {os.path.basename(video_path)}")
+                self._ensure_gpu_memory()
+                dbus_name = self._omx_dbus_name()
+                self.current_process = subprocess.Popen(self._omx_command(video_path, dbus_name, loop=loop),
+                                                        start_new_session=True)
+                self._omx_player = self._omx_connect(self.current_process, dbus_name) if dbus is not None else None
+                self._omx_state = OMX_PLAYING
             self.is_playing = True
             
+            # Warm up the next video's decoder while this one plays
+            if next_path and next_path != video_path and self._omx_player is not None:
+                self._prefetch_thread = threading.Thread(
+                    target=self._prefetch_omxplayer, args=(next_path, loop), daemon=True)
+                self._prefetch_thread.start()
+            
             # Wait for video to finish or timeout
-            self.current_process.wait()
+            # omxplayer has no playback length option, so enforce the duration here
+            if self._wait_for_exit(duration):
+                self._omx_state = OMX_UNINIT
+            elif self._omx_player is not None:
+                # Keep the player resident for the next video, just pause and hide it
+                self._omx_player.Pause()
+                self._omx_set_alpha(self._omx_player, 0)
+                self._omx_state = OMX_IDLE
+            else:
+                self.stop_video()
             self.is_playing = False
             
         except FileNotFoundError:
@@ -69,9 +403,10 @@ class VideoPlayer:
             self.play_video_pygame(video_path, duration)
         except Exception as e:
             logger.error(f"Error playing video with OMXPlayer: {e}")
-            self.is_playing = False
+            # Don't leave a looping player on screen for the next ad to wait on
+            self.stop_video()
     
-    def play_video_vlc(self, video_path, duration=None):
+    def play_video_vlc(self, video_path, duration=None, next_path=None):
         """Play video using VLC (alternative method)"""
         try:
             cmd = [
@@ -84,15 +419,12 @@ class VideoPlayer:
             ]
             
             logger.info(f"Starting VLC for: {os.path.basename(video_path)}")
-            self.current_process = subprocess.Popen(cmd)
+            self.current_process = subprocess.Popen(cmd, start_new_session=True)
             self.is_playing = True
             
-            if duration:
-                # Kill process after duration
-                time.sleep(duration)
+            # Kill process after duration
+            if not self._wait_for_exit(duration):
                 self.stop_video()
-            else:
-                self.current_process.wait()
             
             self.is_playing = False
             
@@ -103,86 +435,232 @@ class VideoPlayer:
             logger.error(f"Error playing video with VLC: {e}")
             self.is_playing = False
     
-    def play_video_pygame(self, video_path, duration=None):
+    def play_video_ffmpeg(self, video_path, duration=None, next_path=None):
+        """Decode video with ffmpeg and blit the raw frames with pygame"""
+        width, height = self.screen_width, self.screen_height
+        frame_size = width * height * 3
+        
+        # Scale and letterbox in ffmpeg; -re paces output at the video's frame rate
+        cmd = [
+            'ffmpeg', '-v', 'quiet', '-re', '-i', video_path,
+            '-vf', f'scale={width}:{height}:force_original_aspect_ratio=decrease,'
+                   f'pad={width}:{height}:(ow-iw)/2:(oh-ih)/2',
+            '-an', '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+        ]
+        if duration:
+            cmd.extend(['-t', str(duration)])
+        cmd.append('-')
+        
+        # Three-frame ring: the decoder thread fills free slots, we show ready ones
+        ring = bytearray(frame_size * 3)
+        view = memoryview(ring)
+        free_slots = queue.Queue()
+        ready_slots = queue.Queue()
+        for slot in range(3):
+            free_slots.put(slot)
+        
+        def read_frames(stdout):
+            # Read straight into the ring; None tells the display loop we are done
+            try:
+                while self.is_playing:
+                    slot = free_slots.get()
+                    frame = view[slot * frame_size:(slot + 1) * frame_size]
+                    got = 0
+                    while got < frame_size:
+                        n = stdout.readinto(frame[got:])
+                        if not n:
+                            return
+                        got += n
+                    ready_slots.put(slot)
+            finally:
+                ready_slots.put(None)
+        
+        process = reader = None
+        try:
+            logger.info(f"Starting ffmpeg decode for: {os.path.basename(video_path)}")
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, start_new_session=True)
+            self.current_process = process
+            self.is_playing = True
+            reader = threading.Thread(target=read_frames, args=(process.stdout,), daemon=True)
+            reader.start()
+            deferred = []  # Events meant for the main loop
+            
+            while self.is_playing:
+                try:
+                    slot = ready_slots.get(timeout=0.05)
+                except queue.Empty:
+                    slot = -1
+                
+                if slot is None:
+                    break
+                if slot >= 0:
+                    frame = pygame.image.frombuffer(view[slot * frame_size:(slot + 1) * frame_size],
+                                                    (width, height), 'RGB')
+                    self.screen.blit(frame, (0, 0))
+                    pygame.display.flip()
+                    del frame
+                    free_slots.put(slot)
+                
+                # peek avoids building an event list on the usual no-key frame
+                if pygame.event.peek(pygame.KEYDOWN):
+                    for event in pygame.event.get(pygame.KEYDOWN):
+                        if event.key == pygame.K_ESCAPE:
+                            self.is_playing = False
+                        else:
+                            deferred.append(event)
+            
+            self.stop_video()
+            for event in deferred:
+                pygame.event.post(event)
+            
+        except FileNotFoundError:
+            logger.warning("ffmpeg not found, falling back to pygame")
+            self.play_video_pygame(video_path, duration)
+        except Exception as e:
+            logger.error(f"Error playing video with ffmpeg: {e}")
+            self.stop_video()
+        finally:
+            if reader is not None:
+                free_slots.put(0)  # Unblock the reader if it is waiting for a slot
+                reader.join(timeout=1)
+            if process is not None:
+                process.stdout.close()
+    
+    def play_video_pygame(self, video_path, duration=None, next_path=None):
         """Fallback video player using pygame (basic functionality)"""
         try:
             # For pygame, we'll show a video placeholder
             # Real video playback would require pygame_gui or similar
-            logger.info(f"Pygame video placeholder for: {os.path.basename(video_path)}")
+            filename = os.path.basename(video_path)
+            logger.info(f"Pygame video placeholder for: {filename}")
             
             self.is_playing = True
-            start_time = time.time()
+            start_time = time.monotonic()
+            center_x, center_y = self.screen_width // 2, self.screen_height // 2
+            target_fps = 10
+            frame_idx = 0
+            deferred = []  # Events meant for the main loop
+            
+            # Create a simple animated placeholder; freetype draws straight
+            # onto the screen from its internal glyph cache
+            pygame.freetype.init()
+            font = pygame.freetype.Font(None, 48)
             
-            # Create a simple animated placeholder
-            font = pygame.font.Font(None, 48)
+            # The filename line never changes, so lay it out once
+            text1 = f"VIDEO: {filename}"
+            text1_rect = font.get_rect(text1)
+            text1_rect.center = (center_x, center_y - 30)
+            last_tenth = -1
+            
+            # Paint the whole screen once; frames only repaint behind the text
+            self.screen.fill(_BG[255])
+            pygame.display.flip()
+            prev_area = text1_rect
             
             while self.is_playing:
-                current_time = time.time()
+                current_time = time.monotonic()
                 elapsed = current_time - start_time
                 
                 if duration and elapsed >= duration:
                     break
                 
-                # Animated background
-                color_intensity = int(128 + 127 * abs(time.time() % 2 - 1))
-                self.screen.fill((color_intensity // 4, color_intensity // 6, color_intensity // 8))
+                # Sleep in SDL until the next frame is due or an event arrives
+                next_frame = start_time + frame_idx / target_fps
+                if current_time < next_frame:
+                    # A timeout of 0 would block forever, so wait at least 1 ms
+                    event = pygame.event.wait(max(1, int((next_frame - current_time) * 1000)))
+                    if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+                        self.is_playing = False
+                    elif event.type != pygame.NOEVENT:
+                        deferred.append(event)
+                    continue
+                frame_idx += 1
                 
                 # Display video info
-                filename = os.path.basename(video_path)
-                text1 = font.render(f"VIDEO: {filename}", True, (255, 255, 255))
-                text2 = font.render(f"Time: {elapsed:.1f}s", True, (200, 200, 200))
-                
-                text1_rect = text1.get_rect(center=(self.screen_width//2, self.screen_height//2 - 30))
-                text2_rect = text2.get_rect(center=(self.screen_width//2, self.screen_height//2 + 30))
+                tenth = int(elapsed * 10)
+                if tenth != last_tenth:
+                    last_tenth = tenth
+                    text2 = f"Time: {tenth / 10:.1f}s"
+                    text2_rect = font.get_rect(text2)
+                    text2_rect.center = (center_x, center_y + 30)
                 
-                self.screen.blit(text1, text1_rect)
-                self.screen.blit(text2, text2_rect)
-                pygame.display.flip()
+                # Animated background behind the text, covering last frame's text too
+                text_area = text1_rect.union(text2_rect)
+                dirty = text_area.union(prev_area)
+                prev_area = text_area
+                # Triangle wave over 256 ticks per 2 s, between intensities 255 and 128
+                tick = int(current_time * 128) & 255
+                self.screen.fill(_BG[255 - tick if tick < 128 else tick], dirty)
                 
-                # Handle events
-                for event in pygame.event.get():
-                    if event.type == pygame.KEYDOWN:
-                        if event.key == pygame.K_ESCAPE:
-                            self.is_playing = False
-                
-                time.sleep(0.1)  # Small delay
+                font.render_to(self.screen, text1_rect, text1, fgcolor=(255, 255, 255))
+                font.render_to(self.screen, text2_rect, text2, fgcolor=(200, 200, 200))
+                pygame.display.update(dirty)
             
+            # Hand back events such as QUIT or ad timers to the main loop
+            for event in deferred:
+                pygame.event.post(event)
             self.is_playing = False
             
         except Exception as e:
             logger.error(f"Error in pygame video player: {e}")
             self.is_playing = False
     
-    def play_video(self, video_path, duration=None):
-        """Main video playback method - tries different players"""
-        if not os.path.exists(video_path):
+    def play_video(self, video_path, duration=None, next_path=None):
+        """Main video playback method - tries different players
+        
+        next_path, if given, is the video that will be played after this one
+        and may be prepared in the background.
+        """
+        if not self._video_exists(video_path):
             logger.error(f"Video file not found: {video_path}")
             return
         
-        # Try different video players in order of preference for Raspberry Pi
+        self._play_fn(video_path, duration, next_path)
+    
+    def _video_exists(self, video_path):
+        """Check the video is a regular file, re-checking at most every 30s"""
+        now = time.monotonic()
+        last_seen = self._stat_cache.get(video_path)
+        if last_seen is not None and now - last_seen < 30:
+            return True
+        
         try:
-            # First try OMXPlayer (best for Raspberry Pi)
-            self.play_video_omxplayer(video_path, duration)
-        except:
-            try:
-                # Then try VLC
-                self.play_video_vlc(video_path, duration)
-            except:
-                # Finally fall back to pygame
-                self.play_video_pygame(video_path, duration)
+            is_file = stat.S_ISREG(os.stat(video_path).st_mode)
+        except OSError:
+            is_file = False
+        
+        if is_file:
+            self._stat_cache[video_path] = now
+        else:
+            self._stat_cache.pop(video_path, None)
+        return is_file
     
     def stop_video(self):
         """Stop current video playback"""
         self.is_playing = False
-        if self.current_process and self.current_process.poll() is None:
-            try:
-                self.current_process.terminate()
-                self.current_process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                self.current_process.kill()
-            except Exception as e:
-                logger.error(f"Error stopping video: {e}")
+        if self.current_process:
+            # Signal the group even if the wrapper exited; its children may not have
+            self._terminate_process(self.current_process)
         self.current_process = None
+        self._omx_player = None
+        self._omx_state = OMX_UNINIT
+        # Don't leave a hidden player for a next video that may never come
+        self._discard_prefetch()
+    
+    def _discard_prefetch(self):
+        """Stop the hidden omxplayer started for the next video, if any"""
+        if self._prefetch_thread is not None:
+            self._prefetch_thread.join()
+            self._prefetch_thread = None
+        
+        prefetch, self._prefetch = self._prefetch, None
+        if prefetch is not None:
+            self._terminate_process(prefetch[1])
+    
+    def close(self):
+        """Stop all player processes, including the resident and prefetched omxplayer"""
+        self.stop_video()
+        self._selector.close()
     
     def is_video_playing(self):
         """Check if video is currently playing"""